@@ -1,16 +1,34 @@
+import hashlib
 import io
-import re
-from dataclasses import dataclass
+import multiprocessing
+import operator
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 import streamlit as st
-from pypdf import PdfReader
-
-from openpyxl import load_workbook
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
+import xlsxwriter
+
+
+from sed_parsers import (
+    AUDIT_COLS,
+    DEFAULT_PDF_ENGINE,
+    FIN_COLS,
+    LINE_COLS,
+    LINE_NUM_COLS,
+    MONEY_COLS,
+    PDF_ENGINES,
+    ParsedDocument,
+    failed_document,
+    process_one,
+)
 
 
 # =========================
@@ -54,985 +72,290 @@ st.caption(APP_SUBTITLE)
 
 
 # =========================
-# OUTPUT COLUMNS
-# =========================
-FIN_COLS = [
-    "Documento",
-    "Pais",
-    "Tipo_Documento",
-    "Proveedor_Razon_Social",
-    "Proveedor_Id_Tributaria",
-    "Cliente_Razon_Social",
-    "Cliente_Id_Tributaria",
-    "Prefijo",
-    "Factura_Numero",
-    "Consecutivo",
-    "Fecha_Emision",
-    "Condicion_Venta",
-    "Forma_Pago",
-    "Medio_Pago",
-    "Moneda",
-    "Simbolo_Moneda",
-    "Subtotal",
-    "Impuesto_IVA",
-    "Total_Factura",
-    "OC",
-    "CUFE",
-    "Resolucion_DIAN",
-    "QR_o_Codigo",
-    "Clave_Numerica",
-    "Codigo_Unico_Consulta",
-    "Anticipo",
-    "Saldo",
-    "Costo_Factura_Marcado",
-    "Probable_Escaneado",
-    "Metodo_Extraccion",
-    "Error",
-]
-
-LINE_COLS = [
-    "Factura_Numero",
-    "Documento",
-    "Linea",
-    "Codigo_Item",
-    "Descripcion",
-    "Cantidad",
-    "Unidad",
-    "Precio_Unitario",
-    "Descuento",
-    "Subtotal_Linea",
-    "Impuesto_Linea",
-    "Total_Linea",
-    "Moneda",
-    "Pais",
-    "Marca_Costo",
-    "Cuenta_Costo",
-    "Descripcion_Raw",
-]
-
-
-# =========================
-# DATA STRUCTURES
-# =========================
-@dataclass
-class FinanceInvoice:
-    Documento: str
-    Pais: str = ""
-    Tipo_Documento: str = "Factura"
-
-    Proveedor_Razon_Social: str = ""
-    Proveedor_Id_Tributaria: str = ""
-    Cliente_Razon_Social: str = ""
-    Cliente_Id_Tributaria: str = ""
-
-    Prefijo: str = ""
-    Factura_Numero: str = ""
-    Consecutivo: str = ""
-    Fecha_Emision: str = ""
-
-    Condicion_Venta: str = ""
-    Forma_Pago: str = ""
-    Medio_Pago: str = ""
-
-    Moneda: str = ""
-    Simbolo_Moneda: str = ""
-    Subtotal: Optional[float] = None
-    Impuesto_IVA: Optional[float] = None
-    Total_Factura: Optional[float] = None
-
-    OC: str = ""
-    CUFE: str = ""
-    Resolucion_DIAN: str = ""
-    QR_o_Codigo: str = ""
-
-    Clave_Numerica: str = ""
-    Codigo_Unico_Consulta: str = ""
-
-    Anticipo: Optional[float] = None
-    Saldo: Optional[float] = None
-
-    Costo_Factura_Marcado: str = ""
-    Probable_Escaneado: str = ""
-    Metodo_Extraccion: str = ""
-    Error: str = ""
-
-
-# =========================
-# TEXT UTILITIES
-# =========================
-def normalize_text(t: str) -> str:
-    if t is None:
-        return ""
-    t = t.replace("\u00a0", " ")
-    t = re.sub(r"[ \t]+", " ", t)
-    t = re.sub(r"\n{3,}", "\n\n", t)
-    return t.strip()
-
-
-def extract_text_pypdf(pdf_bytes: bytes) -> str:
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    parts: List[str] = []
-    for page in reader.pages:
-        parts.append(page.extract_text() or "")
-    return normalize_text("\n".join(parts))
-
-
-def looks_scanned(text: str) -> bool:
-    return len((text or "").strip()) < 50
-
-
-def safe_group(m: Optional[re.Match], idx: int = 1) -> str:
-    if not m:
-        return ""
-    try:
-        val = m.group(idx) if m.lastindex and idx <= m.lastindex else m.group(0)
-    except Exception:
-        val = m.group(0) if m else ""
-    return (val or "").strip()
-
-
-def find_first(patterns: List[str], text: str, flags=re.IGNORECASE) -> str:
-    if not text:
-        return ""
-    for p in patterns:
-        m = re.search(p, text, flags)
-        if m:
-            if m.lastindex and m.lastindex >= 1:
-                return safe_group(m, 1)
-            return safe_group(m, 0)
-    return ""
-
-
-def parse_number_latam(s: str) -> Optional[float]:
-    if not s:
-        return None
-    raw = s.strip()
-    raw = re.sub(r"[^\d,.\-]", "", raw)
-    if not raw:
-        return None
-
-    last_comma = raw.rfind(",")
-    last_dot = raw.rfind(".")
-
-    if last_comma > last_dot:
-        raw = raw.replace(".", "")
-        raw = raw.replace(",", ".")
-    else:
-        raw = raw.replace(",", "")
-
-    try:
-        return float(raw)
-    except:
-        return None
-
-
-def detect_currency(text: str) -> Tuple[str, str]:
-    t = text or ""
-    if " CRC" in t or "Moneda: CRC" in t or "Código Moneda........ CRC" in t or "¢" in t:
-        return "CRC", "¢"
-    if " COP" in t or "pesos" in t.lower() or "Bogotá - Colombia" in t or "$" in t:
-        return "COP", "$"
-    return "", ""
-
-
-def lines(text: str) -> List[str]:
-    return [ln.strip() for ln in (text or "").splitlines() if (ln or "").strip()]
-
-
-# =========================
-# FORMAT DETECTORS
-# =========================
-def is_forlan_co(text: str) -> bool:
-    t = (text or "").upper()
-    return "FERRETERIA FORLAN" in t and "FACTURA ELECTR" in t and "TOTAL A PAGAR" in t
-
-
-def is_navatec_cr(text: str) -> bool:
-    t = (text or "").upper()
-    return ("FACTURA ELECTRÓNICA N°" in t or "FACTURA ELECTRONICA N°" in t) and "FACTURAELECTRONICA.CR" in t
-
-
-def is_tribu_cr_hacienda(text: str) -> bool:
-    t = (text or "").upper()
-    return "WWW.HACIENDA.GO.CR" in t and "TRIBU-CR" in t and "COMPROBANTE" in t
-
-
-def is_ciclo_huracan(text: str) -> bool:
-    t = (text or "").upper()
-    return "CICLO HURACAN" in t and "NO COD PRODUCTO" in t and ("TOTAL DE LÍNEA" in t or "TOTAL DE LINEA" in t)
-
-
-def is_brujo_caribeno(text: str) -> bool:
-    t = (text or "").upper()
-    return "EL BRUJO CARIBEÑO" in t and "CÓDIGO UNIDAD CANTIDAD PRECIO" in t
-
-
-def is_erial_office_depot(text: str) -> bool:
-    t = (text or "").upper()
-    return "ERIAL BQ" in t and "LINEA SKU" in t and "IMPUESTO" in t
-
-
-def is_gustavo_gamboa(text: str) -> bool:
-    t = (text or "").upper()
-    return "GUSTAVO GAMBOA VILLALOBOS" in t and "# DESCRIPCIÓN / CÓDIGO" in t
-
-
-# =========================
-# HEADER PARSERS
-# =========================
-def parse_forlan_co_header(text: str, filename: str) -> FinanceInvoice:
-    scanned = looks_scanned(text)
-    moneda, simbolo = detect_currency(text)
-
-    proveedor = find_first([r"(?m)^(FERRETERIA\s+FORLAN\s+SAS)\s*$"], text)
-    proveedor_id = find_first([r"NIT\s*([0-9\.\-]+)"], text)
-
-    cliente = find_first([r"Señores\s+([A-ZÁÉÍÓÚÑ0-9\.\s&\-]+)"], text)
-    cliente_nit = find_first([r"Señores.*?\nNIT\s*([0-9\.\-]+)"], text)
-
-    m = re.search(r"No\.\s*([A-Z]{1,5})\s*\n*\s*([0-9]{3,})", text, re.IGNORECASE)
-    prefijo = (m.group(1) or "").strip() if m else ""
-    consecutivo = (m.group(2) or "").strip() if m else ""
-    factura_num = f"{prefijo} {consecutivo}".strip() if prefijo or consecutivo else ""
-
-    fecha = find_first([r"Generaci[oó]n\s*([0-3]\d\/[01]\d\/[12]\d{3},\s*[0-2]\d:[0-5]\d)"], text)
-    forma_pago = find_first([r"Forma\s+de\s+pago:\s*\n*([A-Za-zÁÉÍÓÚÑ\s]+)"], text)
-    medio_pago = find_first([r"Medio\s+de\s+pago:\s*\n*([A-Za-zÁÉÍÓÚÑ\s\-]+)"], text)
-
-    subtotal_str = find_first([r"Total\s+Bruto\s*([0-9\.,]+)"], text)
-    iva_str = find_first([r"IVA\s*19%\s*([0-9\.,]+)"], text)
-    total_str = find_first([r"Total\s+a\s+Pagar\s*([0-9\.,]+)"], text)
-
-    oc = find_first([r"Oc:\s*(OC[0-9]+)"], text)
-    cufe = find_first([r"CUFE:\s*([a-f0-9]{20,})"], text)
-    resol = find_first([r"Autorizaci[oó]n\s+Electr[oó]nica\s+([0-9]+)"], text)
-    qr_hint = find_first([r"(CUFE:\s*[a-f0-9]{20,})"], text)
-
-    return FinanceInvoice(
-        Documento=filename,
-        Pais="CO",
-        Tipo_Documento="Factura",
-        Proveedor_Razon_Social=proveedor,
-        Proveedor_Id_Tributaria=proveedor_id,
-        Cliente_Razon_Social=cliente,
-        Cliente_Id_Tributaria=cliente_nit,
-        Prefijo=prefijo,
-        Factura_Numero=factura_num,
-        Consecutivo=consecutivo,
-        Fecha_Emision=fecha,
-        Forma_Pago=forma_pago,
-        Medio_Pago=medio_pago,
-        Moneda=moneda or "COP",
-        Simbolo_Moneda=simbolo or "$",
-        Subtotal=parse_number_latam(subtotal_str),
-        Impuesto_IVA=parse_number_latam(iva_str),
-        Total_Factura=parse_number_latam(total_str),
-        OC=oc,
-        CUFE=cufe,
-        Resolucion_DIAN=resol,
-        QR_o_Codigo=qr_hint,
-        Probable_Escaneado="SI" if scanned else "NO",
-        Metodo_Extraccion="FORLAN CO (header + líneas)",
-        Error="",
-    )
-
-
-def parse_navatec_cr_header(text: str, filename: str) -> FinanceInvoice:
-    scanned = looks_scanned(text)
-    moneda, simbolo = detect_currency(text)
-
-    proveedor = find_first([r"(?m)^(NAVATEC\s+INGENIERIA\s+S\.A\.)\s*$", r"(?m)^(NAVATECO)\s*$"], text)
-    ids = re.findall(r"Ident\.\s*Jur[ií]dica:\s*([0-9\-]+)", text, flags=re.IGNORECASE)
-    proveedor_id = (ids[0] if len(ids) >= 1 else "").strip()
-    cliente_id = (ids[1] if len(ids) >= 2 else "").strip()
-    cliente = find_first([r"Receptor\s+([A-ZÁÉÍÓÚÑ0-9\.\s&\-]+)"], text)
-
-    factura_num = find_first([r"Factura\s+Electr[oó]nica\s+N°\s*([0-9]+)"], text)
-    fecha = find_first([r"Fecha\s+de\s+Emisi[oó]n:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d\s*[ap]\.m\.)"], text)
-    condicion = find_first([r"Condici[oó]n\s+de\s+venta:\s*([A-Za-zÁÉÍÓÚÑ\s]+)"], text)
-    medio = find_first([r"Medio\s+de\s+Pago:\s*([A-Za-zÁÉÍÓÚÑ\s]+)"], text)
-
-    clave = find_first([r"Clave\s+Num[eé]rica:\s*\n*([0-9]{30,})"], text)
-    cod_unico = find_first([r"C[oó]digo\s+Único\s+de\s+Consulta:\s*([A-Z0-9]+)"], text)
-
-    subtotal_str = find_first([r"Subtotal\s+Neto\s*¢\s*([0-9\.,]+)"], text)
-    iva_str = find_first([r"Total\s+Impuesto\s*¢\s*([0-9\.,]+)"], text)
-    total_str = find_first([r"Total\s+Factura:\s*¢\s*([0-9\.,]+)"], text)
-    anticipo_str = find_first([r"ANTICIPO\s*¢\s*([0-9\.,]+)"], text)
-    saldo_str = find_first([r"SALDO\s*¢\s*([0-9\.,]+)"], text)
-
-    return FinanceInvoice(
-        Documento=filename,
-        Pais="CR",
-        Tipo_Documento="Factura",
-        Proveedor_Razon_Social=proveedor,
-        Proveedor_Id_Tributaria=proveedor_id,
-        Cliente_Razon_Social=cliente,
-        Cliente_Id_Tributaria=cliente_id,
-        Factura_Numero=factura_num,
-        Fecha_Emision=fecha,
-        Condicion_Venta=condicion,
-        Medio_Pago=medio,
-        Moneda=moneda or "CRC",
-        Simbolo_Moneda=simbolo or "¢",
-        Subtotal=parse_number_latam(subtotal_str),
-        Impuesto_IVA=parse_number_latam(iva_str),
-        Total_Factura=parse_number_latam(total_str),
-        Anticipo=parse_number_latam(anticipo_str),
-        Saldo=parse_number_latam(saldo_str),
-        Clave_Numerica=clave,
-        Codigo_Unico_Consulta=cod_unico,
-        Probable_Escaneado="SI" if scanned else "NO",
-        Metodo_Extraccion="NAVATEC CR (header + líneas)",
-        Error="",
-    )
-
-
-def parse_tribu_hacienda_cr_header(text: str, filename: str) -> FinanceInvoice:
-    # Basic header extraction
-    scanned = looks_scanned(text)
-    moneda, simbolo = detect_currency(text)
-
-    proveedor = find_first([r"Nombre:\s*([A-ZÁÉÍÓÚÑ\s]+)\nNombre comercial:"], text)
-    proveedor_id = find_first([r"C[eé]dula:\s*([0-9]+)"], text)
-    consecutivo = find_first([r"Consecutivo:\s*([0-9]+)"], text)
-    clave = find_first([r"Clave:\s*([0-9]{30,})"], text)
-    fecha = find_first([r"Fecha:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d:[0-5]\d)"], text)
-
-    subtotal_str = find_first([r"Total\s+venta\s+neta\s*([0-9\.,]+)"], text)
-    iva_str = find_first([r"Total\s+impuestos\s*([0-9\.,]+)"], text)
-    total_str = find_first([r"Total\s+comprobante\s*([0-9\.,]+)"], text)
-
-    return FinanceInvoice(
-        Documento=filename,
-        Pais="CR",
-        Tipo_Documento="Factura",
-        Proveedor_Razon_Social=proveedor,
-        Proveedor_Id_Tributaria=proveedor_id,
-        Cliente_Razon_Social=find_first([r"DATOS\s+DEL\s+CLIENTE\s+Nombre:\s*([A-ZÁÉÍÓÚÑ\s]+)"], text),
-        Cliente_Id_Tributaria=find_first([r"DATOS\s+DEL\s+CLIENTE.*?C[eé]dula:\s*([0-9]+)"], text),
-        Factura_Numero=consecutivo,
-        Consecutivo=consecutivo,
-        Fecha_Emision=fecha,
-        Condicion_Venta=find_first([r"Condici[oó]n\s+de\s+Venta:\s*([A-Za-zÁÉÍÓÚÑ\s]+)"], text),
-        Medio_Pago=find_first([r"Medio\s+de\s+Pago:\s*([A-Za-zÁÉÍÓÚÑ\s\-]+)"], text),
-        Moneda=moneda or "CRC",
-        Simbolo_Moneda=simbolo or "¢",
-        Subtotal=parse_number_latam(subtotal_str),
-        Impuesto_IVA=parse_number_latam(iva_str),
-        Total_Factura=parse_number_latam(total_str),
-        Clave_Numerica=clave,
-        Probable_Escaneado="SI" if scanned else "NO",
-        Metodo_Extraccion="TRIBU-CR / Hacienda (header + líneas)",
-        Error="",
-    )
-
-
-def parse_generic_header(text: str, filename: str, pais_hint: str = "") -> FinanceInvoice:
-    scanned = looks_scanned(text)
-    moneda, simbolo = detect_currency(text)
-
-    proveedor = find_first(
-        [
-            r"Raz[oó]n\s+Social[:\s]+([A-ZÁÉÍÓÚÑ0-9&\-\.\s]{4,})",
-            r"Nombre:\s*([A-ZÁÉÍÓÚÑ0-9\.\s&\-]+)\n",
-            r"Emisor[:\s]+([A-ZÁÉÍÓÚÑ0-9&\-\.\s]{4,})",
-        ],
-        text,
-    ).split("\n")[0].strip()
-
-    proveedor_id = find_first(
-        [
-            r"NIT[:\s]*([0-9\.\-]{6,20})",
-            r"Identificaci[oó]n:\s*([0-9]+)",
-            r"C[eé]dula:\s*([0-9]+)",
-            r"Ident\.\s*Jur[ií]dica:\s*([0-9\-]+)",
-        ],
-        text,
-    )
-
-    factura_num = find_first(
-        [
-            r"Factura\s+Electr[oó]nica[:\s#]*([0-9]{8,})",
-            r"Consecutivo:\s*([0-9]+)",
-            r"Factura\s*(?:No\.|Nro\.|N°|#)?\s*[:\s]*([A-Z0-9\-]{3,})",
-        ],
-        text,
-    )
-
-    fecha = find_first(
-        [
-            r"Fecha:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d:[0-5]\d)",
-            r"Fecha\s+y\s+Hora\s+de\s+Emisi[oó]n:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d:[0-5]\d\s*[AP]M)",
-            r"Fecha\s+de\s+Emisi[oó]n:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s*[0-2]?\d:[0-5]\d)",
-        ],
-        text,
-    )
-
-    inv = FinanceInvoice(
-        Documento=filename,
-        Pais=pais_hint,
-        Tipo_Documento="Factura",
-        Proveedor_Razon_Social=proveedor,
-        Proveedor_Id_Tributaria=proveedor_id,
-        Factura_Numero=factura_num,
-        Fecha_Emision=fecha,
-        Moneda=moneda,
-        Simbolo_Moneda=simbolo,
-        Probable_Escaneado="SI" if scanned else "NO",
-        Metodo_Extraccion="Genérico (header)",
-        Error="",
-    )
-    return inv
-
-
-# =========================
-# LINE ITEMS PARSERS
+# EXCEL FORMATTING + GROUPING
 # =========================
-def items_forlan_co(text: str, inv: FinanceInvoice) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    for ln in lines(text):
-        m = re.match(
-            r"^(?P<item>\d+)\s+(?P<codigo>\d{3,})\s+(?P<qty>\d+(?:\.\d+)?)\s+(?P<desc>.+?)\s+(?P<unit>[0-9\.,]+)\s+(?P<bruto>[0-9\.,]+)\s+(?P<total>[0-9\.,]+)\s*$",
-            ln
-        )
-        if not m:
-            continue
-        out.append({
-            "Factura_Numero": inv.Factura_Numero,
-            "Documento": inv.Documento,
-            "Linea": m.group("item"),
-            "Codigo_Item": m.group("codigo"),
-            "Descripcion": m.group("desc").strip(),
-            "Cantidad": parse_number_latam(m.group("qty")),
-            "Unidad": "",
-            "Precio_Unitario": parse_number_latam(m.group("unit")),
-            "Descuento": None,
-            "Subtotal_Linea": parse_number_latam(m.group("bruto")),
-            "Impuesto_Linea": None,
-            "Total_Linea": parse_number_latam(m.group("total")),
-            "Moneda": inv.Moneda,
-            "Pais": inv.Pais,
-            "Marca_Costo": "",
-            "Cuenta_Costo": "",
-            "Descripcion_Raw": ln,
-        })
-    return out
-
-
-def items_navatec_cr(text: str, inv: FinanceInvoice) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    pat = re.compile(
-        r"^(?P<linea>\d{3})\s+"
-        r"(?P<cantidad>\d+(?:\.\d+)?)\s+"
-        r"(?P<unidad>\w+)\s+"
-        r"(?P<codigo>[A-Z0-9]+)\s+"
-        r"(?P<desc>.+?)\s+"
-        r"(?P<precio>[0-9\.,]+)\s+"
-        r"(?P<descuento>[0-9\.,]+)\s+"
-        r"(?P<subtotal>[0-9\.,]+)\s+"
-        r"(?P<imp>[0-9\.,]+)\s*$"
-    )
-    for ln in lines(text):
-        m = pat.match(ln)
-        if not m:
-            continue
-
-        subtotal_linea = parse_number_latam(m.group("subtotal"))
-        imp = parse_number_latam(m.group("imp"))
-        total_linea = (subtotal_linea + imp) if (subtotal_linea is not None and imp is not None) else None
-
-        out.append({
-            "Factura_Numero": inv.Factura_Numero,
-            "Documento": inv.Documento,
-            "Linea": m.group("linea"),
-            "Codigo_Item": m.group("codigo"),
-            "Descripcion": m.group("desc").strip(),
-            "Cantidad": parse_number_latam(m.group("cantidad")),
-            "Unidad": m.group("unidad"),
-            "Precio_Unitario": parse_number_latam(m.group("precio")),
-            "Descuento": parse_number_latam(m.group("descuento")),
-            "Subtotal_Linea": subtotal_linea,
-            "Impuesto_Linea": imp,
-            "Total_Linea": total_linea,
-            "Moneda": inv.Moneda,
-            "Pais": inv.Pais,
-            "Marca_Costo": "",
-            "Cuenta_Costo": "",
-            "Descripcion_Raw": ln,
-        })
-    return out
-
-
-def items_tribu_hacienda_cr(text: str, inv: FinanceInvoice) -> List[Dict[str, Any]]:
+def excel_number_len(x: float) -> int:
+    """Length of a number as it reads back from the sheet (xlsxwriter writes %.16G)."""
+    t = f"{x:.16G}"
+    return len(str(float(t) if "." in t or "E" in t else int(t)))
+
+
+def column_widths(df: pd.DataFrame) -> List[int]:
+    """Longest text per column (header included) + 2, capped at 60, measured on the frame."""
+    widths: List[int] = []
+    for col in df.columns:
+        s = df[col].dropna()
+        lens = s.map(excel_number_len) if pd.api.types.is_float_dtype(s) else s.astype(str).str.len()
+        longest = max(len(str(col)), int(lens.max()) if len(lens) else 0)
+        widths.append(min(longest + 2, 60))
+    return widths
+
+
+def format_sheet(ws, df: pd.DataFrame) -> None:
+    """No gridlines, frozen header, autofilter over the data and fitted column widths."""
+    ws.hide_gridlines(2)
+    ws.freeze_panes(1, 0)
+    if len(df.columns):
+        ws.autofilter(0, 0, len(df), len(df.columns) - 1)
+    for col_idx, width in enumerate(column_widths(df)):
+        ws.set_column(col_idx, col_idx, width)
+
+
+def invoice_group_rows(df_lines: pd.DataFrame) -> List[bool]:
     """
-    TRIBU-CR / Hacienda:
-    Busca líneas:
-      <linea> <codigo> <desc>
-    y luego lee un bloque siguiente con valores.
+    True for each line that shares its invoice (first column) with a neighbouring
+    line: runs of 2+ consecutive lines become one outline group. Blank and ""
+    invoices both end up as empty cells; a leading run of them stays ungrouped.
     """
-    out: List[Dict[str, Any]] = []
-    ln_list = lines(text)
-
-    i = 0
-    while i < len(ln_list):
-        ln = ln_list[i]
-        m = re.match(r"^(?P<linea>\d+)\s+(?P<codigo>\d{10,})\s+(?P<desc>.+)$", ln)
-        if not m:
-            i += 1
-            continue
-
-        linea = m.group("linea")
-        codigo = m.group("codigo")
-        desc = m.group("desc").strip()
-
-        j = i + 1
-        blob = ""
-        while j < len(ln_list):
-            if ln_list[j].upper().startswith("OBSERVACIONES"):
-                break
-            if re.match(r"^\d+\s+\d{10,}\s+", ln_list[j]):  # next item
-                break
-            blob += " " + ln_list[j]
-            j += 1
-
-        # qty
-        qty = find_first([r"(\d+,\d+)\s+Unidad", r"(\d+,\d+)\s+Servicios", r"(\d+,\d+)\s+\w+"], blob)
-        nums = re.findall(r"[0-9]{1,3}(?:[0-9\.,]*[0-9])", blob)
-
-        precio = monto = descuento = total = None
-        if len(nums) >= 4:
-            precio = parse_number_latam(nums[-4])
-            monto = parse_number_latam(nums[-3])
-            descuento = parse_number_latam(nums[-2])
-            total = parse_number_latam(nums[-1])
-
-        out.append({
-            "Factura_Numero": inv.Factura_Numero,
-            "Documento": inv.Documento,
-            "Linea": linea,
-            "Codigo_Item": codigo,
-            "Descripcion": desc,
-            "Cantidad": parse_number_latam(qty),
-            "Unidad": "Unidad",
-            "Precio_Unitario": precio,
-            "Descuento": descuento,
-            "Subtotal_Linea": monto,
-            "Impuesto_Linea": None,
-            "Total_Linea": total,
-            "Moneda": inv.Moneda,
-            "Pais": inv.Pais,
-            "Marca_Costo": "",
-            "Cuenta_Costo": "",
-            "Descripcion_Raw": (ln + " | " + blob.strip())[:1000],
-        })
-
-        i = j
-    return out
-
-
-def items_ciclo_huracan(text: str, inv: FinanceInvoice) -> List[Dict[str, Any]]:
+    if df_lines.empty or not len(df_lines.columns):
+        return [False] * len(df_lines)
+    factura = df_lines.iloc[:, 0].fillna("")
+    runs = factura.ne(factura.shift()).cumsum()
+    grouped = runs.map(runs.value_counts()) > 1
+    if factura.iloc[0] == "":
+        grouped &= runs.ne(1)
+    return grouped.tolist()
+
+
+def write_sheet_rows(
+    workbook: xlsxwriter.Workbook,
+    sheet_name: str,
+    df: pd.DataFrame,
+    header_fmt,
+    grouped: Optional[Sequence[bool]] = None,
+) -> None:
     """
-    CICLO HURACAN:
-      <No> <Cod> <Producto...>
-      luego bloque con qty/unid y total
+    Writes `df` row by row (header first). constant_memory flushes each row as
+    soon as the next one starts, so cells must arrive in row order and each
+    row's outline level (`grouped`) is set right before its cells.
     """
-    out: List[Dict[str, Any]] = []
-    ln_list = lines(text)
-
-    i = 0
-    while i < len(ln_list):
-        ln = ln_list[i]
-        m = re.match(r"^(?P<linea>\d+)\s+(?P<codigo>\d+)\s+(?P<desc>.+)$", ln)
-        if not m:
-            i += 1
-            continue
-
-        linea = m.group("linea")
-        codigo = m.group("codigo")
-        desc = m.group("desc").strip()
-
-        blob = ""
-        j = i + 1
-        while j < len(ln_list):
-            if ln_list[j].upper().startswith("COMENTARIO"):
-                break
-            if re.match(r"^\d+\s+\d+\s+", ln_list[j]):  # next item
-                break
-            blob += " " + ln_list[j]
-            j += 1
-
-        qty = find_first([r"(\d+(?:\.\d+)?)\s+Unid"], blob)
-        # find last CRC amount as total
-        total = find_first([r"CRC\s*([0-9\.,]+)\s*$"], blob)
-        # first CRC amount as price-ish
-        precio = find_first([r"CRC\s*([0-9\.,]+)"], blob)
-
-        imp = None
-        m_imp = re.search(r"IVA\s*13%.*?CRC\s*([0-9\.,]+)", blob, re.IGNORECASE)
-        if m_imp:
-            imp = parse_number_latam(m_imp.group(1))
-
-        out.append({
-            "Factura_Numero": inv.Factura_Numero,
-            "Documento": inv.Documento,
-            "Linea": linea,
-            "Codigo_Item": codigo,
-            "Descripcion": desc,
-            "Cantidad": parse_number_latam(qty),
-            "Unidad": "Unid",
-            "Precio_Unitario": parse_number_latam(precio),
-            "Descuento": 0.0,
-            "Subtotal_Linea": None,
-            "Impuesto_Linea": imp,
-            "Total_Linea": parse_number_latam(total),
-            "Moneda": inv.Moneda,
-            "Pais": inv.Pais,
-            "Marca_Costo": "",
-            "Cuenta_Costo": "",
-            "Descripcion_Raw": (ln + " | " + blob.strip())[:1000],
-        })
-
-        i = j
-    return out
-
-
-def items_brujo_caribeno(text: str, inv: FinanceInvoice) -> List[Dict[str, Any]]:
+    ws = workbook.add_worksheet(sheet_name)
+    format_sheet(ws, df)
+    ws.write_row(0, 0, list(df.columns), header_fmt)
+    # NaN/NA -> None (blank cell); xlsxwriter rejects NaN numbers
+    values = df.astype(object).where(df.notna(), None)
+    for r, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        if grouped is not None and grouped[r - 1]:
+            ws.set_row(r, None, None, {"level": 1})
+        ws.write_row(r, 0, row)
+
+
+def write_audit_rows(workbook: xlsxwriter.Workbook, df_audit: pd.DataFrame, header_fmt) -> None:
     """
-    EL BRUJO CARIBEÑO:
-      Descripción larga arriba; luego una línea numérica:
-      C01 Al 1.00 300,000.00 0.00 300,000.00 39,000.00
+    AUDITORIA_TEXTO (AUDIT_COLS, no gaps): typed writes straight from the columns,
+    without the object copy and per-cell type dispatch of write_sheet_rows.
     """
-    out: List[Dict[str, Any]] = []
-    ln_list = lines(text)
-
-    last_desc = ""
-    line_count = 0
+    ws = workbook.add_worksheet("AUDITORIA_TEXTO")
+    format_sheet(ws, df_audit)
+    ws.write_row(0, 0, AUDIT_COLS, header_fmt)
+    rows = zip(df_audit["Documento"], df_audit["Longitud_Texto"].tolist(), df_audit["Texto"])
+    for r, (doc, length, texto) in enumerate(rows, start=1):
+        ws.write_string(r, 0, doc)
+        ws.write_number(r, 1, length)
+        if texto:  # empty text stays a blank cell, as write() leaves it
+            ws.write_string(r, 2, texto)
 
-    for ln in ln_list:
-        # captura descripción tipo servicio
-        if "Servicios de alquiler" in ln:
-            last_desc = ln.strip()
 
-        m = re.match(
-            r"^(?P<codigo>[A-Z0-9]+)\s+(?P<unidad>\w+)\s+(?P<qty>\d+(?:\.\d+)?)\s+(?P<precio>[0-9\.,]+)\s+(?P<descnt>[0-9\.,]+)\s+(?P<subt>[0-9\.,]+)\s+(?P<imp>[0-9\.,]+)\s*$",
-            ln
-        )
-        if not m:
-            continue
-
-        line_count += 1
-        subtotal = parse_number_latam(m.group("subt"))
-        imp = parse_number_latam(m.group("imp"))
-        total = (subtotal + imp) if (subtotal is not None and imp is not None) else None
-
-        out.append({
-            "Factura_Numero": inv.Factura_Numero,
-            "Documento": inv.Documento,
-            "Linea": str(line_count),
-            "Codigo_Item": m.group("codigo"),
-            "Descripcion": last_desc or "SERVICIO",
-            "Cantidad": parse_number_latam(m.group("qty")),
-            "Unidad": m.group("unidad"),
-            "Precio_Unitario": parse_number_latam(m.group("precio")),
-            "Descuento": parse_number_latam(m.group("descnt")),
-            "Subtotal_Linea": subtotal,
-            "Impuesto_Linea": imp,
-            "Total_Linea": total,
-            "Moneda": inv.Moneda,
-            "Pais": inv.Pais,
-            "Marca_Costo": "",
-            "Cuenta_Costo": "",
-            "Descripcion_Raw": ln,
-        })
-
-    return out
-
-
-def items_erial_office_depot(text: str, inv: FinanceInvoice) -> List[Dict[str, Any]]:
-    """
-    ERIAL BQ (Office Depot):
-      1 3212900039900 ... 1.00 Unid 876.11 876.11 113.89 13.00 0.00 990.00
-    """
-    out: List[Dict[str, Any]] = []
-    for ln in lines(text):
-        m = re.match(
-            r"^(?P<linea>\d+)\s+(?P<sku>\d{10,})\s+(?P<desc>.+?)\s+(?P<qty>\d+(?:\.\d+)?)\s+(?P<uni>\w+)\s+(?P<pu>[0-9\.,]+)\s+(?P<subt>[0-9\.,]+)\s+(?P<imp>[0-9\.,]+)\s+(?P<pct>[0-9\.,]+)\s+(?P<descnt>[0-9\.,]+)\s+(?P<total>[0-9\.,]+)\s*$",
-            ln
-        )
-        if not m:
-            continue
-
-        out.append({
-            "Factura_Numero": inv.Factura_Numero,
-            "Documento": inv.Documento,
-            "Linea": m.group("linea"),
-            "Codigo_Item": m.group("sku"),
-            "Descripcion": m.group("desc").strip(),
-            "Cantidad": parse_number_latam(m.group("qty")),
-            "Unidad": m.group("uni"),
-            "Precio_Unitario": parse_number_latam(m.group("pu")),
-            "Descuento": parse_number_latam(m.group("descnt")),
-            "Subtotal_Linea": parse_number_latam(m.group("subt")),
-            "Impuesto_Linea": parse_number_latam(m.group("imp")),
-            "Total_Linea": parse_number_latam(m.group("total")),
-            "Moneda": inv.Moneda,
-            "Pais": inv.Pais,
-            "Marca_Costo": "",
-            "Cuenta_Costo": "",
-            "Descripcion_Raw": ln,
-        })
-    return out
-
-
-def items_gustavo_gamboa(text: str, inv: FinanceInvoice) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    for ln in lines(text):
-        m = re.match(
-            r"^(?P<linea>\d+)\s+(?P<codigo>[A-Z0-9]+)\s+(?P<desc>.+?)\s+(?P<qty>\d+(?:\.\d+)?)\s+(?P<precio>[0-9\.,]+)\s+(?P<uni>Serv\s+Prof|\w+)\s+(?P<descnt>[0-9\.,]+)\s+(?P<pct>[0-9\.,]+)\s+%.*?\s+(?P<imp>[0-9\.,]+)\s+(?P<total>[0-9\.,]+)\s*$",
-            ln,
-            re.IGNORECASE
-        )
-        if not m:
-            continue
-
-        total = parse_number_latam(m.group("total"))
-        imp = parse_number_latam(m.group("imp"))
-        subtotal = (total - imp) if (total is not None and imp is not None) else None
-
-        out.append({
-            "Factura_Numero": inv.Factura_Numero,
-            "Documento": inv.Documento,
-            "Linea": m.group("linea"),
-            "Codigo_Item": m.group("codigo"),
-            "Descripcion": m.group("desc").strip(),
-            "Cantidad": parse_number_latam(m.group("qty")),
-            "Unidad": m.group("uni").strip(),
-            "Precio_Unitario": parse_number_latam(m.group("precio")),
-            "Descuento": parse_number_latam(m.group("descnt")),
-            "Subtotal_Linea": subtotal,
-            "Impuesto_Linea": imp,
-            "Total_Linea": total,
-            "Moneda": inv.Moneda,
-            "Pais": inv.Pais,
-            "Marca_Costo": "",
-            "Cuenta_Costo": "",
-            "Descripcion_Raw": ln,
-        })
-    return out
+def build_excel_bytes(df_fin: pd.DataFrame, df_lines: pd.DataFrame, df_audit: pd.DataFrame) -> bytes:
+    out = io.BytesIO()
+    # xlsxwriter in constant_memory mode streams each row to a temp file instead of
+    # keeping a cell tree; all formatting is applied in the same single pass.
+    # (DataFrame.to_excel writes column by column, which constant_memory drops.)
+    # Cells are PDF text: never turn it into formulas or hyperlinks (write() would
+    # otherwise link QR/URL strings and drop any URL longer than Excel's limit).
+    workbook = xlsxwriter.Workbook(
+        out,
+        {
+            "constant_memory": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+            # every cell uses the body font through the Normal style, no per-cell fonts
+            "default_format_properties": {"font_name": "Century Gothic", "font_size": 10},
+        },
+    )
+    # DataFrame.to_excel header border/alignment; not bold, the body font has
+    # always been applied over the header too
+    header_fmt = workbook.add_format({"border": 1, "align": "center", "valign": "top"})
+    write_sheet_rows(workbook, "FINANZAS_FACTURAS", df_fin, header_fmt)
+    # line items grouped per invoice (outline level 1, expanded)
+    write_sheet_rows(workbook, "LINEAS_FACTURA", df_lines, header_fmt, invoice_group_rows(df_lines))
+    write_audit_rows(workbook, df_audit, header_fmt)
+    workbook.close()
+    return out.getvalue()
 
 
 # =========================
-# EXCEL FORMATTING + GROUPING
+# CORE PROCESSING
 # =========================
-def autosize_columns(ws):
-    for col_idx, col_cells in enumerate(ws.columns, start=1):
-        max_len = 0
-        for cell in col_cells:
-            val = "" if cell.value is None else str(cell.value)
-            if len(val) > max_len:
-                max_len = len(val)
-        ws.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 2, 60)
-
-
-def apply_global_excel_formatting(wb):
-    font = Font(name="Century Gothic", size=10)
-    for ws in wb.worksheets:
-        ws.sheet_view.showGridLines = False
-        ws.freeze_panes = "A2"
-        ws.auto_filter.ref = ws.dimensions
-
-        for row in ws.iter_rows():
-            for cell in row:
-                cell.font = font
-
-        autosize_columns(ws)
-
-
-def group_line_items_by_invoice(ws, factura_col_letter: str = "A"):
-    ws.sheet_properties.outlinePr.summaryBelow = True
-    ws.sheet_view.showOutlineSymbols = True
-
-    current = None
-    start_row = None
-    max_row = ws.max_row
-
-    for r in range(2, max_row + 1):
-        val = ws[f"{factura_col_letter}{r}"].value
-        if val != current:
-            if current is not None and start_row is not None:
-                end_row = r - 1
-                if end_row > start_row:
-                    ws.row_dimensions.group(start_row, end_row, outline_level=1, hidden=False)
-            current = val
-            start_row = r
-
-    if current is not None and start_row is not None:
-        end_row = max_row
-        if end_row > start_row:
-            ws.row_dimensions.group(start_row, end_row, outline_level=1, hidden=False)
+def extraction_workers() -> int:
+    """Núcleos realmente disponibles para este proceso (respeta cgroups/afinidad)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
 
 
-def build_excel_bytes(df_fin: pd.DataFrame, df_lines: pd.DataFrame, df_audit: pd.DataFrame) -> bytes:
-    out = io.BytesIO()
-    with pd.ExcelWriter(out, engine="openpyxl") as writer:
-        df_fin.to_excel(writer, index=False, sheet_name="FINANZAS_FACTURAS")
-        df_lines.to_excel(writer, index=False, sheet_name="LINEAS_FACTURA")
-        df_audit.to_excel(writer, index=False, sheet_name="AUDITORIA_TEXTO")
+@st.cache_resource(show_spinner=False)
+def get_extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido entre ejecuciones: arrancar los workers
+    (spawn re-importa el intérprete) cuesta más que extraer un PDF pequeño.
+    """
+    # spawn: the Streamlit server is multi-threaded and forking it is unsafe
+    ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
 
-    out.seek(0)
-    wb = load_workbook(out)
 
-    apply_global_excel_formatting(wb)
+def parse_documents(
+    blobs: List[bytes],
+    names: List[str],
+    engine: str = DEFAULT_PDF_ENGINE,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[ParsedDocument]:
+    """
+    Extrae y parsea cada PDF en paralelo (un proceso por núcleo).
+    Devuelve, en el orden de entrada, el resultado de cada documento.
+    """
+    results: List[Optional[ParsedDocument]] = [None] * len(blobs)
+    workers = min(len(blobs), extraction_workers())
+
+    if workers <= 1:
+        for i, (pdf_bytes, name) in enumerate(zip(blobs, names)):
+            results[i] = process_one(pdf_bytes, name, engine)
+            if on_progress:
+                on_progress(i + 1, len(blobs))
+        return results
+
+    ex = get_extraction_pool(extraction_workers())
+    futures = {ex.submit(process_one, pdf_bytes, name, engine): i for i, (pdf_bytes, name) in enumerate(zip(blobs, names))}
+    for done, fut in enumerate(as_completed(futures), start=1):
+        i = futures[fut]
+        try:
+            results[i] = fut.result()
+        except BrokenProcessPool as e:
+            # a worker died (e.g. OOM): drop the pool so the next run starts a fresh one
+            get_extraction_pool.clear()
+            results[i] = failed_document(names[i], e)
+        except Exception as e:
+            results[i] = failed_document(names[i], e)
+        if on_progress:
+            on_progress(done, len(blobs))
+    return results
 
-    if "LINEAS_FACTURA" in wb.sheetnames:
-        ws = wb["LINEAS_FACTURA"]
-        group_line_items_by_invoice(ws, factura_col_letter="A")
 
-    final = io.BytesIO()
-    wb.save(final)
-    return final.getvalue()
+def content_key(pdf_bytes: bytes) -> str:
+    return hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
 
 
-# =========================
-# CORE PROCESSING
-# =========================
-def process_files(files, include_audit: bool, audit_chars: int) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    fin_rows: List[Dict[str, Any]] = []
-    line_rows: List[Dict[str, Any]] = []
-    audit_rows: List[Dict[str, Any]] = []
+DOCUMENT_CACHE_SIZE = 256
 
-    for uf in files:
-        pdf_bytes = uf.read()
-        try:
-            text = extract_text_pypdf(pdf_bytes)
-
-            # Default currency
-            cur, sym = detect_currency(text)
-
-            # Header + Lines by type
-            if is_forlan_co(text):
-                inv = parse_forlan_co_header(text, uf.name)
-                items = items_forlan_co(text, inv)
-
-            elif is_navatec_cr(text):
-                inv = parse_navatec_cr_header(text, uf.name)
-                items = items_navatec_cr(text, inv)
-
-            elif is_tribu_cr_hacienda(text):
-                inv = parse_tribu_hacienda_cr_header(text, uf.name)
-                items = items_tribu_hacienda_cr(text, inv)
-
-            elif is_ciclo_huracan(text):
-                inv = parse_generic_header(text, uf.name, pais_hint="CR")
-                inv.Pais = "CR"
-                if not inv.Moneda:
-                    inv.Moneda, inv.Simbolo_Moneda = (cur or "CRC"), (sym or "¢")
-                inv.Metodo_Extraccion = "CICLO HURACAN (header + líneas)"
-                items = items_ciclo_huracan(text, inv)
-
-            elif is_brujo_caribeno(text):
-                inv = parse_generic_header(text, uf.name, pais_hint="CR")
-                inv.Pais = "CR"
-                if not inv.Moneda:
-                    inv.Moneda, inv.Simbolo_Moneda = (cur or "CRC"), (sym or "¢")
-                inv.Metodo_Extraccion = "EL BRUJO CARIBEÑO (header + líneas)"
-                items = items_brujo_caribeno(text, inv)
-
-            elif is_erial_office_depot(text):
-                inv = parse_generic_header(text, uf.name, pais_hint="CR")
-                inv.Pais = "CR"
-                if not inv.Moneda:
-                    inv.Moneda, inv.Simbolo_Moneda = (cur or "CRC"), (sym or "¢")
-                inv.Metodo_Extraccion = "ERIAL BQ (header + líneas)"
-                items = items_erial_office_depot(text, inv)
-
-            elif is_gustavo_gamboa(text):
-                inv = parse_generic_header(text, uf.name, pais_hint="CR")
-                inv.Pais = "CR"
-                if not inv.Moneda:
-                    inv.Moneda, inv.Simbolo_Moneda = (cur or "CRC"), (sym or "¢")
-                inv.Metodo_Extraccion = "GUSTAVO GAMBOA (header + líneas)"
-                items = items_gustavo_gamboa(text, inv)
 
-            else:
-                inv = parse_generic_header(text, uf.name)
-                if not inv.Moneda:
-                    inv.Moneda, inv.Simbolo_Moneda = cur, sym
-                inv.Metodo_Extraccion = inv.Metodo_Extraccion or "Genérico (header)"
-                items = []
-
-            fin_row = inv.__dict__
-            fin_rows.append({c: fin_row.get(c, "") for c in FIN_COLS})
-
-            # Lines (if none -> single marker row)
-            if items:
-                for it in items:
-                    line_rows.append({c: it.get(c, "") for c in LINE_COLS})
-            else:
-                line_rows.append({
-                    "Factura_Numero": inv.Factura_Numero,
-                    "Documento": inv.Documento,
-                    "Linea": "",
-                    "Codigo_Item": "",
-                    "Descripcion": "",
-                    "Cantidad": None,
-                    "Unidad": "",
-                    "Precio_Unitario": None,
-                    "Descuento": None,
-                    "Subtotal_Linea": None,
-                    "Impuesto_Linea": None,
-                    "Total_Linea": None,
-                    "Moneda": inv.Moneda,
-                    "Pais": inv.Pais,
-                    "Marca_Costo": "",
-                    "Cuenta_Costo": "",
-                    "Descripcion_Raw": "SIN_LINEAS_DETECTADAS",
-                })
-
-            if include_audit:
-                audit_rows.append({
-                    "Documento": uf.name,
-                    "Longitud_Texto": len(text),
-                    "Texto": (text or "")[:audit_chars],
-                })
+@st.cache_resource(show_spinner=False)
+def get_document_cache() -> Tuple["OrderedDict[Tuple[str, str, str], ParsedDocument]", threading.Lock]:
+    """
+    LRU por documento compartido entre sesiones: (blake2b, nombre, motor) -> resultado.
+    El nombre entra en la clave porque el resultado lleva el nombre del archivo.
+    """
+    return OrderedDict(), threading.Lock()
 
-        except Exception as e:
-            err_row = {c: "" for c in FIN_COLS}
-            err_row["Documento"] = uf.name
-            err_row["Metodo_Extraccion"] = "ERROR"
-            err_row["Error"] = str(e)
-            fin_rows.append(err_row)
-
-            line_rows.append({
-                "Factura_Numero": "",
-                "Documento": uf.name,
-                "Linea": "",
-                "Codigo_Item": "",
-                "Descripcion": "",
-                "Cantidad": None,
-                "Unidad": "",
-                "Precio_Unitario": None,
-                "Descuento": None,
-                "Subtotal_Linea": None,
-                "Impuesto_Linea": None,
-                "Total_Linea": None,
-                "Moneda": "",
-                "Pais": "",
-                "Marca_Costo": "",
-                "Cuenta_Costo": "",
-                "Descripcion_Raw": f"ERROR: {e}",
-            })
-
-            if include_audit:
-                audit_rows.append({"Documento": uf.name, "Longitud_Texto": 0, "Texto": f"ERROR: {e}"})
-
-    df_fin = pd.DataFrame(fin_rows, columns=FIN_COLS)
-    df_lines = pd.DataFrame(line_rows, columns=LINE_COLS)
-    df_audit = pd.DataFrame(audit_rows) if include_audit else pd.DataFrame(columns=["Documento", "Longitud_Texto", "Texto"])
+
+def parse_documents_cached(
+    content_keys: Tuple[str, ...],
+    names: Tuple[str, ...],
+    engine: str,
+    files: Sequence[Any],
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[ParsedDocument]:
+    """
+    Cache por contenido y por documento: re-procesar los mismos PDFs (p. ej. tras
+    cambiar la auditoría) o añadir uno más al lote solo extrae los que faltan.
+    La clave es el blake2b de cada PDF (content_keys); los errores no se guardan
+    para que el siguiente intento vuelva a extraer.
+    Solo se leen los bytes de los documentos que no están en cache.
+    """
+    cache, lock = get_document_cache()
+    keys = [(k, n, engine) for k, n in zip(content_keys, names)]
+    with lock:
+        docs: List[Optional[ParsedDocument]] = [cache.get(k) for k in keys]
+        for k, doc in zip(keys, docs):
+            if doc is not None:
+                cache.move_to_end(k)
+
+    todo = [i for i, doc in enumerate(docs) if doc is None]
+    hits = len(docs) - len(todo)
+    if not todo:
+        if on_progress and docs:
+            on_progress(len(docs), len(docs))
+        return docs
+
+    progress = (lambda done, _total: on_progress(hits + done, len(docs))) if on_progress else None
+    parsed = parse_documents([files[i].getvalue() for i in todo], [names[i] for i in todo], engine=engine, on_progress=progress)
+    with lock:
+        for i, doc in zip(todo, parsed):
+            docs[i] = doc
+            if not doc.error:
+                cache[keys[i]] = doc
+        while len(cache) > DOCUMENT_CACHE_SIZE:
+            cache.popitem(last=False)
+    return docs
+
+
+LINE_FACTURA_IDX = LINE_COLS.index("Factura_Numero")
+LINE_DOCUMENTO_IDX = LINE_COLS.index("Documento")
+LINE_LINEA_IDX = LINE_COLS.index("Linea")
+
+
+def process_files(
+    files,
+    include_audit: bool,
+    audit_chars: int,
+    engine: str = DEFAULT_PDF_ENGINE,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    # rows stay tuples until the end, then each frame is built column-wise
+    fin_rows: List[Tuple[Any, ...]] = []
+    # line rows bucketed by (Factura_Numero, Documento) as they arrive, so the
+    # final order only needs a sort of the keys and of each bucket by Linea
+    line_buckets: Dict[Tuple[str, str], List[Tuple[Any, ...]]] = {}
+    audit_data: Dict[str, List[Any]] = {c: [] for c in AUDIT_COLS}
+
+    # getvalue() hands back the upload buffer without a seek+read copy; no
+    # list of every PDF's bytes is kept, cache misses fetch theirs on submit.
+    keys = tuple(content_key(uf.getvalue()) for uf in files)
+    names = tuple(uf.name for uf in files)
+    docs = parse_documents_cached(keys, names, engine, files, on_progress=on_progress)
+
+    for name, doc in zip(names, docs):
+        fin_rows.append(doc.fin_row)
+        for row in doc.line_rows:
+            line_buckets.setdefault((row[LINE_FACTURA_IDX] or "", row[LINE_DOCUMENTO_IDX]), []).append(row)
+
+        if include_audit:
+            audit_data["Documento"].append(name)
+            if doc.error:
+                audit_data["Longitud_Texto"].append(0)
+                audit_data["Texto"].append(f"ERROR: {doc.error}")
+            else:
+                audit_data["Longitud_Texto"].append(len(doc.text))
+                audit_data["Texto"].append((doc.text or "")[:audit_chars])
+
+    # one C-level transpose instead of a per-cell append loop
+    fin_data = dict(zip(FIN_COLS, zip(*fin_rows))) if fin_rows else {c: () for c in FIN_COLS}
+    # amounts arrive parsed from the workers: float64 arrays (None -> NaN)
+    for c in MONEY_COLS:
+        fin_data[c] = np.array(fin_data[c], dtype="float64")
+    df_fin = pd.DataFrame(fin_data, columns=FIN_COLS)
+    # same order as a stable sort by Factura_Numero, Documento, Linea
+    by_linea = operator.itemgetter(LINE_LINEA_IDX)
+    line_rows = [row for key in sorted(line_buckets) for row in sorted(line_buckets[key], key=by_linea)]
+    # amount columns go in as float64 arrays (None -> NaN) instead of
+    # letting pandas infer each one from objects
+    line_data = dict(zip(LINE_COLS, zip(*line_rows))) if line_rows else {c: () for c in LINE_COLS}
+    for c in LINE_NUM_COLS:
+        line_data[c] = np.array(line_data[c], dtype="float64")
+    df_lines = pd.DataFrame(line_data, columns=LINE_COLS)
+    df_audit = pd.DataFrame(audit_data, columns=AUDIT_COLS)
 
     df_lines["Factura_Numero"] = df_lines["Factura_Numero"].fillna("")
-    df_lines = df_lines.sort_values(by=["Factura_Numero", "Documento", "Linea"], kind="stable").reset_index(drop=True)
 
     return df_fin, df_lines, df_audit
 
@@ -1059,6 +382,13 @@ with st.container():
         show_audit = st.checkbox("Mostrar auditoría", value=False)
         show_text = st.checkbox("Mostrar texto", value=False, help="Solo en detalle de la factura seleccionada.")
         audit_chars = st.slider("Texto auditoría (caracteres)", 2000, 32000, 12000, 500)
+        pdf_engine = st.selectbox(
+            "Motor PDF",
+            options=list(PDF_ENGINES),
+            index=list(PDF_ENGINES).index(DEFAULT_PDF_ENGINE),
+            help="pypdf es el motor de referencia de los parsers. PyMuPDF (si está instalado) es más rápido, "
+                 "pero puede ordenar el texto de forma distinta.",
+        )
 
     with c3:
         process_btn = st.button("🚀 Procesar", type="primary", use_container_width=True)
@@ -1074,10 +404,23 @@ if process_btn:
         st.error("Sube al menos un PDF.")
         st.stop()
 
+    progress = st.progress(0.0, text="Extrayendo texto…")
+
+    def _update_progress(done: int, total: int):
+        progress.progress(done / total, text=f"Extrayendo texto… {done}/{total}")
+
     with st.spinner("Procesando facturas…"):
-        df_fin, df_lines, df_audit = process_files(uploaded_files, include_audit=show_audit, audit_chars=audit_chars)
+        df_fin, df_lines, df_audit = process_files(
+            uploaded_files,
+            include_audit=show_audit,
+            audit_chars=audit_chars,
+            engine=pdf_engine,
+            on_progress=_update_progress,
+        )
+    progress.empty()
 
     st.session_state["df_fin"] = df_fin
+    st.session_state["fin_version"] = uuid.uuid4().hex
     st.session_state["df_lines"] = df_lines
     st.session_state["df_audit"] = df_audit
 
@@ -1087,6 +430,39 @@ if process_btn:
 # =========================
 # REPORT (Unified) + ZOOM DETAIL
 # =========================
+@st.cache_data(show_spinner=False, max_entries=32)
+def filter_invoices(
+    _df_fin: pd.DataFrame,
+    fin_version: str,
+    pais_filter: Tuple[str, ...],
+    metodo_filter: Tuple[str, ...],
+    search: str,
+) -> pd.DataFrame:
+    """
+    Vista filtrada del reporte. Cacheada por versión del procesamiento + filtros,
+    así seleccionar una fila no vuelve a recorrer el DataFrame.
+    """
+    df_fin = _df_fin
+
+    # One boolean mask for all filters, applied once (no intermediate frames)
+    mask = pd.Series(True, index=df_fin.index)
+    if pais_filter and "Pais" in df_fin.columns:
+        mask &= df_fin["Pais"].isin(pais_filter)
+    if metodo_filter and "Metodo_Extraccion" in df_fin.columns:
+        mask &= df_fin["Metodo_Extraccion"].isin(metodo_filter)
+
+    if search.strip():
+        s = search.strip().lower()
+        cols = [c for c in ["Proveedor_Razon_Social", "Proveedor_Id_Tributaria", "Factura_Numero", "Documento", "Cliente_Razon_Social"] if c in df_fin.columns]
+        if cols:
+            hits = pd.Series(False, index=df_fin.index)
+            for c in cols:
+                hits |= df_fin[c].astype(str).str.lower().str.contains(s, na=False, regex=False)
+            mask &= hits
+
+    return df_fin.loc[mask]
+
+
 if "df_fin" in st.session_state and not st.session_state["df_fin"].empty:
     df_fin = st.session_state["df_fin"]
     df_lines = st.session_state.get("df_lines", pd.DataFrame())
@@ -1103,27 +479,15 @@ if "df_fin" in st.session_state and not st.session_state["df_fin"].empty:
         metodo_vals = sorted([m for m in df_fin.get("Metodo_Extraccion", pd.Series(dtype=str)).dropna().unique().tolist() if str(m).strip()])
         metodo_filter = st.multiselect("🧠 Método", options=metodo_vals, default=metodo_vals)
 
-    view = df_fin.copy()
-    if pais_filter and "Pais" in view.columns:
-        view = view[view["Pais"].isin(pais_filter)]
-    if metodo_filter and "Metodo_Extraccion" in view.columns:
-        view = view[view["Metodo_Extraccion"].isin(metodo_filter)]
-
-    if search.strip():
-        s = search.strip().lower()
-        cols = [c for c in ["Proveedor_Razon_Social", "Proveedor_Id_Tributaria", "Factura_Numero", "Documento", "Cliente_Razon_Social"] if c in view.columns]
-        if cols:
-            mask = False
-            for c in cols:
-                mask = mask | view[c].astype(str).str.lower().str.contains(s, na=False)
-            view = view[mask]
+    fin_version = st.session_state.setdefault("fin_version", uuid.uuid4().hex)
+    view = filter_invoices(df_fin, fin_version, tuple(pais_filter), tuple(metodo_filter), search)
 
     left, right = st.columns([1.1, 1.4], gap="large")
 
     # LEFT
     with left:
         st.subheader("📌 Facturas (Reporte)")
-        st.caption("Usa búsqueda/filtros. Selecciona una factura para ver detalle.")
+        st.caption("Usa búsqueda/filtros. Selecciona una fila de la tabla para ver detalle.")
 
         display_cols = [
             "Documento", "Pais", "Proveedor_Razon_Social", "Proveedor_Id_Tributaria",
@@ -1135,21 +499,23 @@ if "df_fin" in st.session_state and not st.session_state["df_fin"].empty:
             st.info("No hay resultados con los filtros actuales.")
             st.stop()
 
-        options = []
-        for i, r in view_disp.iterrows():
-            factura = r.get("Factura_Numero", "")
-            prov = (r.get("Proveedor_Razon_Social", "") or "")[:28]
-            total = r.get("Total_Factura", "")
-            options.append(f"{i+1:03d} | {factura} | {prov} | {total}")
-
-        selected = st.selectbox("📄 Selección", options=options, index=0)
-        sel_idx = int(selected.split("|")[0].strip()) - 1
-        selected_row = view_disp.iloc[sel_idx].to_dict()
-
+        # Native row selection: no per-row Python loop to build selectbox labels
         st.markdown('<div class="table-scroll">', unsafe_allow_html=True)
-        st.dataframe(view_disp, use_container_width=True, height=520)
+        event = st.dataframe(
+            view_disp,
+            use_container_width=True,
+            height=520,
+            on_select="rerun",
+            selection_mode="single-row",
+            key="facturas_view",
+        )
         st.markdown("</div>", unsafe_allow_html=True)
 
+        # The selection may point past the end after a filter shrinks the view
+        sel_rows = event.selection.rows
+        sel_idx = sel_rows[0] if sel_rows and sel_rows[0] < len(view_disp) else 0
+        selected_row = view_disp.iloc[sel_idx].to_dict()
+
     # RIGHT
     with right:
         st.subheader("🔍 Detalle de la factura")
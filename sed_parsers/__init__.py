@@ -0,0 +1,45 @@
+from .extraction import (
+    DEFAULT_PDF_ENGINE,
+    PDF_ENGINES,
+    extract_text,
+    extract_text_pdfium,
+    extract_text_pymupdf,
+    extract_text_pypdf,
+    normalize_text,
+)
+from .parsers import (
+    AUDIT_COLS,
+    FIN_COLS,
+    LINE_COLS,
+    LINE_NUM_COLS,
+    MONEY_COLS,
+    FinanceInvoice,
+    ParsedDocument,
+    detect_format,
+    failed_document,
+    parse_document,
+    parse_number_latam,
+    process_one,
+)
+
+__all__ = [
+    "AUDIT_COLS",
+    "DEFAULT_PDF_ENGINE",
+    "FIN_COLS",
+    "LINE_COLS",
+    "LINE_NUM_COLS",
+    "MONEY_COLS",
+    "PDF_ENGINES",
+    "FinanceInvoice",
+    "ParsedDocument",
+    "detect_format",
+    "extract_text",
+    "extract_text_pdfium",
+    "extract_text_pymupdf",
+    "extract_text_pypdf",
+    "failed_document",
+    "normalize_text",
+    "parse_document",
+    "parse_number_latam",
+    "process_one",
+]
@@ -0,0 +1,169 @@
+import io
+import re
+import time
+from importlib.util import find_spec
+from typing import Callable, Dict, List, Optional
+
+
+# =========================
+# PDF TEXT EXTRACTION
+# =========================
+# Lives outside app.py so worker processes can import (and pickle) it:
+# the Streamlit script itself is not an importable module.
+SPACES_RE = re.compile(r"[ \t]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def normalize_line_spacing(t: str) -> str:
+    """Per-page part of normalize_text: NBSP and runs of spaces/tabs."""
+    t = t.replace("\u00a0", " ")
+    # every single space is a SPACES_RE match, so sub() would rebuild the whole
+    # page even when there is nothing to collapse (the usual pypdf output)
+    if "  " not in t and "\t" not in t:
+        return t
+    return SPACES_RE.sub(" ", t)
+
+
+def join_pages(pages: List[str]) -> str:
+    """Joins pages already passed through normalize_line_spacing."""
+    text = "\n".join(pages)
+    if "\n\n\n" in text:
+        text = BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+
+def normalize_text(t: str) -> str:
+    if t is None:
+        return ""
+    return join_pages([normalize_line_spacing(t)])
+
+
+# Wall-clock cap for pypdf on a single page after the first. Invoice pages take
+# milliseconds; only graphics-heavy pages (logos, vector QR codes) get near it.
+PAGE_TIME_BUDGET_S = 2.0
+# Pages after the first whose (decoded) content stream is larger than this are
+# probed before extraction: a stream that shows almost no text in its first
+# PAGE_PREFIX_BYTES is a drawing, skipped before pypdf parses it at all.
+PAGE_STREAM_LIMIT = 256 * 1024
+PAGE_PREFIX_BYTES = 16 * 1024
+PAGE_PREFIX_MIN_TEXT_OPS = 3
+# text-showing operators: (...) Tj, <...> Tj, [...] TJ, (...) ' and (...) "
+TEXT_SHOW_RE = re.compile(rb"[)>\]]\s*(?:Tj|TJ|'|\")")
+
+
+class PageBudgetExceeded(Exception):
+    pass
+
+
+def extract_page_text_pypdf(page, budget: float = PAGE_TIME_BUDGET_S) -> Optional[str]:
+    """
+    page.extract_text() time-boxed to `budget` seconds: the deadline is checked
+    on every content-stream operator and a page that runs over yields None.
+    Only operator interpretation is bounded: pypdf parses the whole content
+    stream before the first operator is visited (see page_is_drawing).
+    """
+    deadline = time.perf_counter() + budget
+
+    def check_deadline(*_) -> None:
+        if time.perf_counter() > deadline:
+            raise PageBudgetExceeded
+
+    try:
+        return page.extract_text(visitor_operand_before=check_deadline) or ""
+    except PageBudgetExceeded:
+        return None
+
+
+def page_is_drawing(page) -> bool:
+    """
+    Content stream over PAGE_STREAM_LIMIT whose first PAGE_PREFIX_BYTES show
+    (almost) no text. Large pages full of line items keep their text operators
+    from the start and are extracted normally.
+    """
+    contents = page.get_contents()
+    if contents is None:
+        return False
+    data = contents.get_data()
+    if len(data) <= PAGE_STREAM_LIMIT:
+        return False
+    return len(TEXT_SHOW_RE.findall(data, 0, PAGE_PREFIX_BYTES)) < PAGE_PREFIX_MIN_TEXT_OPS
+
+
+# Backends are imported on first use, not at import time: the app process and
+# every spawned worker only pay for the engine actually selected.
+# `skipped` (optional) collects a note per page left out of the text, so the
+# caller can flag the invoice instead of silently losing that page.
+def extract_text_pypdf(pdf_bytes: bytes, skipped: Optional[List[str]] = None) -> str:
+    from pypdf import PdfReader
+
+    # BytesIO over bytes shares the buffer (no copy); PdfReader needs a stream.
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    # Normalise each page as it is extracted, so the raw page text can be freed
+    # right away instead of living alongside the joined and normalised copies.
+    pages: List[str] = []
+    for n, page in enumerate(reader.pages, start=1):
+        if n == 1:
+            # header and totals: always extracted in full, whatever it costs
+            text: Optional[str] = page.extract_text() or ""
+        elif page_is_drawing(page):
+            text = None
+            if skipped is not None:
+                skipped.append(f"pág. {n}: contenido > {PAGE_STREAM_LIMIT // 1024} KB sin texto")
+        else:
+            text = extract_page_text_pypdf(page)
+            if text is None and skipped is not None:
+                skipped.append(f"pág. {n}: extracción > {PAGE_TIME_BUDGET_S:g} s")
+        pages.append(normalize_line_spacing(text or ""))
+    return join_pages(pages)
+
+
+def extract_text_pymupdf(pdf_bytes: bytes, skipped: Optional[List[str]] = None) -> str:
+    import pymupdf  # optional, faster C backend (MuPDF)
+
+    try:
+        doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    except pymupdf.FileDataError:
+        # same fallback as PDFium: pypdf recovers some files MuPDF refuses
+        return extract_text_pypdf(pdf_bytes, skipped)
+    with doc:
+        return join_pages([normalize_line_spacing(page.get_text("text")) for page in doc])
+
+
+def extract_text_pdfium(pdf_bytes: bytes, skipped: Optional[List[str]] = None) -> str:
+    import pypdfium2 as pdfium  # optional, faster C backend (PDFium)
+
+    try:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+    except pdfium.PdfiumError:
+        # PDFium is stricter than pypdf with damaged files
+        return extract_text_pypdf(pdf_bytes, skipped)
+    try:
+        parts: List[str] = []
+        for page in pdf:
+            # close the native handles even if extraction fails: pool workers live long
+            try:
+                textpage = page.get_textpage()
+                try:
+                    # PDFium ends lines with CRLF
+                    parts.append(normalize_line_spacing(textpage.get_text_range().replace("\r\n", "\n")))
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+        return join_pages(parts)
+    finally:
+        pdf.close()
+
+
+# pypdf stays the default: the vendor parsers are tuned to its line layout.
+PDF_ENGINES: Dict[str, Callable[[bytes, Optional[List[str]]], str]] = {"pypdf": extract_text_pypdf}
+if find_spec("pymupdf") is not None:
+    PDF_ENGINES["pymupdf"] = extract_text_pymupdf
+if find_spec("pypdfium2") is not None:
+    PDF_ENGINES["pdfium"] = extract_text_pdfium
+
+DEFAULT_PDF_ENGINE = "pypdf"
+
+
+def extract_text(pdf_bytes: bytes, engine: str = DEFAULT_PDF_ENGINE, skipped: Optional[List[str]] = None) -> str:
+    return PDF_ENGINES[engine](pdf_bytes, skipped)
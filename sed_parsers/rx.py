@@ -0,0 +1,150 @@
+import re
+
+
+# =========================
+# TEXT UTILITY PATTERNS
+# =========================
+# Every pattern the parsers use, compiled once per process at import (parent
+# and each pool worker) and never through the re module's string cache.
+NUM_CLEAN_RE = re.compile(r"[^\d,.\-]")
+# case-insensitive without a lowercased copy of the whole text
+PESOS_RE = re.compile(r"pesos", re.IGNORECASE)
+
+
+# =========================
+# HEADER PATTERNS
+# =========================
+# Runs of whitespace before a value are matched by a single possessive \s*+ /
+# [:\s]*+ (never \s*\n*\s*): the value can't start with whitespace, and stacked
+# quantifiers backtrack polynomially over long blank runs when the value is missing.
+# Whole Forlan header in one alternation (same lookahead scheme as NAVATEC_HEADER_RE).
+# Branches that share a label (Señores -> cliente + NIT, CUFE -> cufe + QR) capture
+# every field they carry in the same match.
+FORLAN_HEADER_RE = re.compile(
+    r"(?=^(?P<proveedor>FERRETERIA\s+FORLAN\s+SAS)\s*$)"
+    r"|(?=NIT\s*(?P<nit>[0-9\.\-]+))"
+    r"|(?=Señores)"
+    r"(?:(?=Señores\s+(?P<cliente>[A-ZÁÉÍÓÚÑ0-9\.\s&\-]+)))?"
+    r"(?:(?=Señores.*?\nNIT\s*(?P<cliente_nit>[0-9\.\-]+)))?"
+    r"|(?=No\.\s*+(?P<prefijo>[A-Z]{1,5})\s*+(?P<consecutivo>[0-9]{3,}))"
+    r"|(?=Generaci[oó]n\s*(?P<fecha>[0-3]\d\/[01]\d\/[12]\d{3},\s*[0-2]\d:[0-5]\d))"
+    r"|(?=Forma\s+de\s+pago:\s*+(?P<forma_pago>[A-Za-zÁÉÍÓÚÑ\s]+))"
+    r"|(?=Medio\s+de\s+pago:\s*+(?P<medio_pago>[A-Za-zÁÉÍÓÚÑ\s\-]+))"
+    r"|(?=Total\s+Bruto\s*(?P<subtotal>[0-9\.,]+))"
+    r"|(?=IVA\s*19%\s*(?P<iva>[0-9\.,]+))"
+    r"|(?=Total\s+a\s+Pagar\s*(?P<total>[0-9\.,]+))"
+    r"|(?=Oc:\s*(?P<oc>OC[0-9]+))"
+    r"|(?=(?P<qr>CUFE:\s*(?P<cufe>[a-f0-9]{20,})))"
+    r"|(?=Autorizaci[oó]n\s+Electr[oó]nica\s+(?P<resolucion>[0-9]+))",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+NAVATEC_PROVEEDOR_RES = (
+    re.compile(r"(?m)^(NAVATEC\s+INGENIERIA\s+S\.A\.)\s*$", re.IGNORECASE),
+    re.compile(r"(?m)^(NAVATECO)\s*$", re.IGNORECASE),
+)
+NAVATEC_IDS_RE = re.compile(r"Ident\.\s*Jur[ií]dica:\s*([0-9\-]+)", re.IGNORECASE)
+# Every remaining header field in one alternation: a single scan instead of one per field.
+# Each branch is a lookahead, so a greedy value (e.g. Receptor) never consumes the
+# label of the next field; scan_fields keeps the first hit per group, as find_first did.
+NAVATEC_HEADER_RE = re.compile(
+    r"(?=Receptor\s+(?P<cliente>[A-ZÁÉÍÓÚÑ0-9\.\s&\-]+))"
+    r"|(?=Factura\s+Electr[oó]nica\s+N°\s*(?P<factura>[0-9]+))"
+    r"|(?=Fecha\s+de\s+Emisi[oó]n:\s*(?P<fecha>[0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d\s*[ap]\.m\.))"
+    r"|(?=Condici[oó]n\s+de\s+venta:\s*(?P<condicion>[A-Za-zÁÉÍÓÚÑ\s]+))"
+    r"|(?=Medio\s+de\s+Pago:\s*(?P<medio>[A-Za-zÁÉÍÓÚÑ\s]+))"
+    r"|(?=Clave\s+Num[eé]rica:\s*+(?P<clave>[0-9]{30,}))"
+    r"|(?=C[oó]digo\s+Único\s+de\s+Consulta:\s*(?P<cod_unico>[A-Z0-9]+))"
+    r"|(?=Subtotal\s+Neto\s*¢\s*(?P<subtotal>[0-9\.,]+))"
+    r"|(?=Total\s+Impuesto\s*¢\s*(?P<iva>[0-9\.,]+))"
+    r"|(?=Total\s+Factura:\s*¢\s*(?P<total>[0-9\.,]+))"
+    r"|(?=ANTICIPO\s*¢\s*(?P<anticipo>[0-9\.,]+))"
+    r"|(?=SALDO\s*¢\s*(?P<saldo>[0-9\.,]+))",
+    re.IGNORECASE,
+)
+
+TRIBU_PROVEEDOR_RE = re.compile(r"Nombre:\s*([A-ZÁÉÍÓÚÑ\s]+)\nNombre comercial:", re.IGNORECASE)
+TRIBU_CEDULA_RE = re.compile(r"C[eé]dula:\s*([0-9]+)", re.IGNORECASE)
+TRIBU_CONSECUTIVO_RE = re.compile(r"Consecutivo:\s*([0-9]+)", re.IGNORECASE)
+TRIBU_CLAVE_RE = re.compile(r"Clave:\s*([0-9]{30,})", re.IGNORECASE)
+TRIBU_FECHA_RE = re.compile(r"Fecha:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d:[0-5]\d)", re.IGNORECASE)
+TRIBU_SUBTOTAL_RE = re.compile(r"Total\s+venta\s+neta\s*([0-9\.,]+)", re.IGNORECASE)
+TRIBU_IVA_RE = re.compile(r"Total\s+impuestos\s*([0-9\.,]+)", re.IGNORECASE)
+TRIBU_TOTAL_RE = re.compile(r"Total\s+comprobante\s*([0-9\.,]+)", re.IGNORECASE)
+TRIBU_CLIENTE_RE = re.compile(r"DATOS\s+DEL\s+CLIENTE\s+Nombre:\s*([A-ZÁÉÍÓÚÑ\s]+)", re.IGNORECASE)
+TRIBU_CLIENTE_ID_RE = re.compile(r"DATOS\s+DEL\s+CLIENTE.*?C[eé]dula:\s*([0-9]+)", re.IGNORECASE)
+TRIBU_CONDICION_RE = re.compile(r"Condici[oó]n\s+de\s+Venta:\s*([A-Za-zÁÉÍÓÚÑ\s]+)", re.IGNORECASE)
+TRIBU_MEDIO_RE = re.compile(r"Medio\s+de\s+Pago:\s*([A-Za-zÁÉÍÓÚÑ\s\-]+)", re.IGNORECASE)
+
+GENERIC_PROVEEDOR_RES = (
+    re.compile(r"Raz[oó]n\s+Social[:\s]+([A-ZÁÉÍÓÚÑ0-9&\-\.\s]{4,})", re.IGNORECASE),
+    re.compile(r"Nombre:\s*([A-ZÁÉÍÓÚÑ0-9\.\s&\-]+)\n", re.IGNORECASE),
+    re.compile(r"Emisor[:\s]+([A-ZÁÉÍÓÚÑ0-9&\-\.\s]{4,})", re.IGNORECASE),
+)
+GENERIC_PROVEEDOR_ID_RES = (
+    re.compile(r"NIT[:\s]*([0-9\.\-]{6,20})", re.IGNORECASE),
+    re.compile(r"Identificaci[oó]n:\s*([0-9]+)", re.IGNORECASE),
+    re.compile(r"C[eé]dula:\s*([0-9]+)", re.IGNORECASE),
+    re.compile(r"Ident\.\s*Jur[ií]dica:\s*([0-9\-]+)", re.IGNORECASE),
+)
+GENERIC_FACTURA_RES = (
+    re.compile(r"Factura\s+Electr[oó]nica[:\s#]*([0-9]{8,})", re.IGNORECASE),
+    re.compile(r"Consecutivo:\s*([0-9]+)", re.IGNORECASE),
+    re.compile(r"Factura\s*+(?:No\.|Nro\.|N°|#)?[:\s]*+([A-Z0-9\-]{3,})", re.IGNORECASE),
+)
+GENERIC_FECHA_RES = (
+    re.compile(r"Fecha:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d:[0-5]\d)", re.IGNORECASE),
+    re.compile(
+        r"Fecha\s+y\s+Hora\s+de\s+Emisi[oó]n:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s+[0-2]\d:[0-5]\d:[0-5]\d\s*[AP]M)",
+        re.IGNORECASE,
+    ),
+    re.compile(r"Fecha\s+de\s+Emisi[oó]n:\s*([0-3]\d\/[01]\d\/[12]\d{3}\s*[0-2]?\d:[0-5]\d)", re.IGNORECASE),
+)
+
+# Line-item blob patterns used through find_first
+TRIBU_QTY_RES = (
+    re.compile(r"(\d+,\d+)\s+Unidad", re.IGNORECASE),
+    re.compile(r"(\d+,\d+)\s+Servicios", re.IGNORECASE),
+    re.compile(r"(\d+,\d+)\s+\w+", re.IGNORECASE),
+)
+CICLO_QTY_RE = re.compile(r"(\d+(?:\.\d+)?)\s+Unid", re.IGNORECASE)
+CICLO_TOTAL_RE = re.compile(r"CRC\s*([0-9\.,]+)\s*$", re.IGNORECASE)
+CICLO_PRECIO_RE = re.compile(r"CRC\s*([0-9\.,]+)", re.IGNORECASE)
+CICLO_IVA_RE = re.compile(r"IVA\s*13%.*?CRC\s*([0-9\.,]+)", re.IGNORECASE)
+
+# Line-item row patterns (one match per text line)
+# Amount tokens are possessive (++): an amount is always followed by whitespace
+# or the line end, so giving digits back can never produce a match and only
+# costs backtracking on lines that almost match.
+FORLAN_ITEM_RE = re.compile(
+    r"^(?P<item>\d+)\s+(?P<codigo>\d{3,})\s+(?P<qty>\d+(?:\.\d+)?)\s+(?P<desc>.+?)\s++(?P<unit>[0-9\.,]++)\s++(?P<bruto>[0-9\.,]++)\s++(?P<total>[0-9\.,]++)\s*$"
+)
+NAVATEC_ITEM_RE = re.compile(
+    r"^(?P<linea>\d{3})\s+"
+    r"(?P<cantidad>\d+(?:\.\d+)?)\s+"
+    r"(?P<unidad>\w+)\s+"
+    r"(?P<codigo>[A-Z0-9]+)\s+"
+    r"(?P<desc>.+?)\s+"
+    r"(?P<precio>[0-9\.,]++)\s+"
+    r"(?P<descuento>[0-9\.,]++)\s+"
+    r"(?P<subtotal>[0-9\.,]++)\s+"
+    r"(?P<imp>[0-9\.,]++)\s*$"
+)
+TRIBU_ITEM_RE = re.compile(r"^(?P<linea>\d+)\s+(?P<codigo>\d{10,})\s+(?P<desc>.+)$")
+TRIBU_NEXT_ITEM_RE = re.compile(r"^\d+\s+\d{10,}\s+")
+# digit ... digit over [0-9.,]: same matches as [0-9]{1,3}(?:[0-9.,]*[0-9]), one quantifier
+TRIBU_AMOUNT_RE = re.compile(r"[0-9][0-9.,]*[0-9]")
+TRIBU_BLOCK_END_RE = re.compile(r"OBSERVACIONES", re.IGNORECASE)
+CICLO_ITEM_RE = re.compile(r"^(?P<linea>\d+)\s+(?P<codigo>\d+)\s+(?P<desc>.+)$")
+CICLO_NEXT_ITEM_RE = re.compile(r"^\d+\s+\d+\s+")
+CICLO_BLOCK_END_RE = re.compile(r"COMENTARIO", re.IGNORECASE)
+BRUJO_ITEM_RE = re.compile(
+    r"^(?P<codigo>[A-Z0-9]+)\s+(?P<unidad>\w+)\s+(?P<qty>\d+(?:\.\d+)?)\s++(?P<precio>[0-9\.,]++)\s++(?P<descnt>[0-9\.,]++)\s++(?P<subt>[0-9\.,]++)\s++(?P<imp>[0-9\.,]++)\s*$"
+)
+ERIAL_ITEM_RE = re.compile(
+    r"^(?P<linea>\d+)\s+(?P<sku>\d{10,})\s+(?P<desc>.+?)\s+(?P<qty>\d+(?:\.\d+)?)\s+(?P<uni>\w+)\s++(?P<pu>[0-9\.,]++)\s++(?P<subt>[0-9\.,]++)\s++(?P<imp>[0-9\.,]++)\s++(?P<pct>[0-9\.,]++)\s++(?P<descnt>[0-9\.,]++)\s++(?P<total>[0-9\.,]++)\s*$"
+)
+GAMBOA_ITEM_RE = re.compile(
+    r"^(?P<linea>\d+)\s+(?P<codigo>[A-Z0-9]+)\s+(?P<desc>.+?)\s+(?P<qty>\d+(?:\.\d+)?)\s++(?P<precio>[0-9\.,]++)\s+(?P<uni>Serv\s+Prof|\w+)\s++(?P<descnt>[0-9\.,]++)\s++(?P<pct>[0-9\.,]++)\s+%.*?\s++(?P<imp>[0-9\.,]++)\s++(?P<total>[0-9\.,]++)\s*$",
+    re.IGNORECASE,
+)